@@ -3,6 +3,7 @@ import os
 from pymongo import MongoClient
 from datetime import datetime
 import random  # necessary for 32bit user_id
+from tracing import init_tracing, mongo_listeners
 
 
 # GET MONGO URI FROM ENV.VARIABLE
@@ -10,6 +11,7 @@ MONGO_URI = os.environ.get("MONGO_URI")
 
 # INITIALISE FLASK APP
 app = Flask(__name__)
+init_tracing(app, force_json=True)  # opt-in via TRACING_ENABLED=1
 
 
 try:
@@ -20,7 +22,7 @@ try:
 
     print(f"Connection-URI: {mongo_uri.split('@')[0]}@...{mongo_uri.split('/')[-1]}")
 
-    client = MongoClient(mongo_uri)
+    client = MongoClient(mongo_uri, event_listeners=mongo_listeners())
     client.admin.command("ping")
     print("Successfully connected to MongoDB Atlas!")
 
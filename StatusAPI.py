@@ -1,8 +1,13 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request, stream_with_context
 import os
-from pymongo import MongoClient
-from datetime import datetime
+import json
+import itertools
+from pymongo import ASCENDING, MongoClient
+from datetime import datetime, timedelta
 import random  # necessary for 32bit user_id
+from archive_logs import ensure_log_indexes
+from idempotency import ensure_idempotency_indexes, make_idempotent
+from tracing import init_tracing, mongo_listeners, span
 
 
 # GET MONGO URI FROM ENV.VARIABLE
@@ -10,6 +15,7 @@ MONGO_URI = os.environ.get("MONGO_URI")
 
 # INITIALISE FLASK APP
 app = Flask(__name__)
+init_tracing(app, force_json=True)  # opt-in via TRACING_ENABLED=1
 
 try:
     # LOAD MONGO DB CONNECTION FROM ENV.VARIABLE
@@ -23,7 +29,7 @@ try:
     print(f"Connection-URI: {mongo_uri.split('@')[0]}@...{mongo_uri.split('/')[-1]}")
 
     # CONNECTION TO MONGO ATLAS
-    client = MongoClient(mongo_uri)
+    client = MongoClient(mongo_uri, event_listeners=mongo_listeners())
 
     # TEST CONNECTION VIA PING
     client.admin.command("ping")
@@ -36,19 +42,48 @@ try:
     customers_collection = db["Customers"]  # confirmed by you ✅
     status_collection = db["Status"]
     logs_collection = db["logs"]
+    idempotency_collection = db["idempotency_keys"]
 
     print("DB & Collections selected.")
 
 except Exception as e:
     print(f"ERROR: Database connection failed: {e}")
+    db = None
     customers_collection = None
     status_collection = None
     logs_collection = None
+    idempotency_collection = None
+
+
+# INDEXES (own block: a failed index build must not take the whole API down)
+if db is not None:
+    # KEY STORE FOR RETRIED REQUESTS (unique + TTL)
+    try:
+        ensure_idempotency_indexes(idempotency_collection)
+    except Exception as e:
+        print(f"ERROR: Idempotency indexes failed: {e}")
+
+    # LOG INDEXES: hanger/time range queries + TTL on archived readings (see archive_logs.py)
+    try:
+        ensure_log_indexes(db)
+    except Exception as e:
+        print(f"ERROR: Log indexes failed: {e}")
+
+
+# TELEMETRY RETRIES: hardware sends {"seq": 17} (+ optional "boot_id" if the
+# counter restarts on reboot) instead of an Idempotency-Key header
+def telemetry_key(data):
+    if not isinstance(data, dict):
+        return None
+    if data.get("seq") is None or data.get("hanger_id") is None:
+        return None
+    return f"{data['hanger_id']}:{data.get('boot_id', '')}:{data['seq']}"
 
 
 # ------- START API ENDPOINTS ------- #
 # 1. API ENDPOINT TO CREATE CUSTOMER
 @app.route("/create_customer", methods=["POST"])
+@make_idempotent(idempotency_collection)
 def create_customer():
     if customers_collection is None:
         return jsonify({"error": "No database connection"}), 500
@@ -128,14 +163,15 @@ def update_status():
 
 
 # 4. LOG SENSOR DATA (Temperature + Humidity from Hardware)
-# Hardware sends: {"hanger_id": 1024, "temp": 45.5, "hum": 52.1}
+# Hardware sends: {"hanger_id": 1024, "temp": 45.5, "hum": 52.1, "seq": 17}
 @app.route("/log_temp", methods=["POST"])
+@make_idempotent(idempotency_collection, key_from_body=telemetry_key)
 def log_temperature():
     if logs_collection is None or customers_collection is None:
         return jsonify({"error": "No database connection"}), 500
 
     try:
-        data = request.get_json(force=True)
+        data = request.get_json(force=True)  # parse is timed in the tracing hook
 
         hanger_id = data.get("hanger_id")
         temp = data.get("temp")
@@ -145,20 +181,21 @@ def log_temperature():
             return jsonify({"error": "Missing required fields: hanger_id, temp, hum"}), 400
 
         try:
-            hanger_id_int = int(hanger_id)
-            temp_float = float(temp)
-            hum_float = float(hum)
+            with span("validation"):
+                hanger_id_int = int(hanger_id)
+                temp_float = float(temp)
+                hum_float = float(hum)
 
-            # Safety check: 16-bit Hanger ID range
-            if not (0 <= hanger_id_int <= 2**16 - 1):
-                return jsonify({"error": "Hanger ID out of valid 16-bit range"}), 400
+                # Safety check: 16-bit Hanger ID range
+                if not (0 <= hanger_id_int <= 2**16 - 1):
+                    return jsonify({"error": "Hanger ID out of valid 16-bit range"}), 400
 
-            # Optional sanity checks (adjust if your sensor behaves differently)
-            if not (-40.0 <= temp_float <= 125.0):
-                return jsonify({"error": "temp out of expected range (-40..125)"}), 400
+                # Optional sanity checks (adjust if your sensor behaves differently)
+                if not (-40.0 <= temp_float <= 125.0):
+                    return jsonify({"error": "temp out of expected range (-40..125)"}), 400
 
-            if not (0.0 <= hum_float <= 100.0):
-                return jsonify({"error": "hum out of expected range (0..100)"}), 400
+                if not (0.0 <= hum_float <= 100.0):
+                    return jsonify({"error": "hum out of expected range (0..100)"}), 400
 
             # LOOKUP OWNER
             owner = customers_collection.find_one({"hangers.hanger_id": hanger_id_int})
@@ -175,11 +212,75 @@ def log_temperature():
                 "timestamp": datetime.now(),
             }
 
+            if data.get("seq") is not None:
+                log_entry["seq"] = int(data["seq"])
+
         except ValueError:
             return jsonify({"error": "Data type error: hanger_id must be int, temp/hum must be float"}), 400
 
         result = logs_collection.insert_one(log_entry)
-        return jsonify({"message": "Log entry created", "id": str(result.inserted_id)}), 201
+        with span("serialize"):
+            response = jsonify({"message": "Log entry created", "id": str(result.inserted_id)})
+        return response, 201
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+# 5. EXPORT SENSOR LOGS (streamed as NDJSON)
+# App calls: /logs/export?hanger_id=1024&from=2024-01-01&to=2024-01-31
+@app.route("/logs/export", methods=["GET"])
+def export_logs():
+    if logs_collection is None:
+        return jsonify({"error": "No database connection"}), 500
+
+    try:
+        hanger_id = request.args.get("hanger_id")
+        date_from = request.args.get("from")
+        date_to = request.args.get("to")
+
+        if hanger_id is None or not date_from or not date_to:
+            return jsonify({"error": "Missing required parameters: hanger_id, from, to"}), 400
+
+        try:
+            hanger_id_int = int(hanger_id)
+            start = datetime.strptime(date_from, "%Y-%m-%d")
+            # "to" is inclusive -> up to the start of the next day
+            end = datetime.strptime(date_to, "%Y-%m-%d") + timedelta(days=1)
+        except ValueError:
+            return jsonify({"error": "hanger_id must be int, from/to must be YYYY-MM-DD"}), 400
+
+        if end <= start:
+            return jsonify({"error": "'to' must not be before 'from'"}), 400
+
+        cursor = logs_collection.find(
+            {"hanger_id": hanger_id_int, "timestamp": {"$gte": start, "$lt": end}},
+            {"_id": 0, "user_id": 1, "hanger_id": 1, "temp": 1, "hum": 1, "timestamp": 1},
+        ).sort("timestamp", ASCENDING).batch_size(1000)
+
+        # Run the query + fetch the first batch BEFORE the 200 is sent, so
+        # database errors still end up in the except below as a 500
+        first = next(cursor, None)
+
+        # Stream line by line, so large ranges are never held in memory
+        def generate():
+            if first is None:
+                return
+            try:
+                for doc in itertools.chain([first], cursor):
+                    doc["timestamp"] = doc["timestamp"].isoformat()
+                    yield json.dumps(doc) + "\n"
+            except Exception as e:
+                # Headers are already sent -> mark the file as incomplete
+                print("ERROR: log export aborted:", e)
+                yield json.dumps({"error": "Export aborted", "details": str(e)}) + "\n"
+
+        filename = f"logs_{hanger_id_int}_{date_from}_{date_to}.ndjson"
+        return Response(
+            stream_with_context(generate()),
+            mimetype="application/x-ndjson",
+            headers={"Content-Disposition": f"attachment; filename={filename}"},
+        )
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -0,0 +1,134 @@
+import gzip
+import json
+import os
+from datetime import datetime, timedelta
+
+from pymongo import ASCENDING, MongoClient
+from pymongo.errors import OperationFailure
+
+# ARCHIVE JOB FOR SMARTHANGER SENSOR LOGS
+# Run daily (e.g. Render Cron Job): python archive_logs.py
+# For every full day older than LOG_RETENTION_DAYS:
+#   1. keep hourly rollups (avg/min/max per hanger) in "logs_hourly"
+#   2. stream raw readings to ARCHIVE_DIR/logs_YYYY-MM-DD.ndjson.gz
+#   3. mark the archived raw readings with "archived_at"
+# The TTL index is on "archived_at", NOT on "timestamp": raw logs only expire
+# after they were archived and rolled up. If this job stops running, nothing is
+# deleted and "logs" grows again -> check the job output / Render cron alerts.
+
+LOG_RETENTION_DAYS = int(os.environ.get("LOG_RETENTION_DAYS", 30))
+LOG_TTL_GRACE_DAYS = int(os.environ.get("LOG_TTL_GRACE_DAYS", 1))
+ARCHIVE_DIR = os.environ.get("ARCHIVE_DIR", "archive")
+
+
+def ensure_log_indexes(db):
+    logs_collection = db["logs"]
+    # hanger/time range queries (export) + time range scans (this job)
+    logs_collection.create_index([("hanger_id", ASCENDING), ("timestamp", ASCENDING)])
+
+    logs_collection.create_index([("timestamp", ASCENDING)])
+
+    # ARCHIVED RAW LOGS ARE KEPT FOR LOG_TTL_GRACE_DAYS, then removed by TTL
+    ttl_seconds = LOG_TTL_GRACE_DAYS * 24 * 3600
+    try:
+        logs_collection.create_index("archived_at", name="archived_at_ttl", expireAfterSeconds=ttl_seconds)
+    except OperationFailure:
+        # Index exists with another window -> adjust it in place
+        db.command("collMod", "logs", index={"name": "archived_at_ttl", "expireAfterSeconds": ttl_seconds})
+
+
+def rollup_day(logs_collection, start, end):
+    # HOURLY ROLLUPS, merged so re-running a day does not duplicate anything
+    logs_collection.aggregate([
+        {"$match": {"timestamp": {"$gte": start, "$lt": end}}},
+        {
+            "$group": {
+                "_id": {
+                    "hanger_id": "$hanger_id",
+                    "hour": {"$dateTrunc": {"date": "$timestamp", "unit": "hour"}},
+                },
+                "user_id": {"$last": "$user_id"},
+                "count": {"$sum": 1},
+                "temp_avg": {"$avg": "$temp"},
+                "temp_min": {"$min": "$temp"},
+                "temp_max": {"$max": "$temp"},
+                "hum_avg": {"$avg": "$hum"},
+                "hum_min": {"$min": "$hum"},
+                "hum_max": {"$max": "$hum"},
+            }
+        },
+        {"$merge": {"into": "logs_hourly", "on": "_id", "whenMatched": "replace"}},
+    ])
+
+
+def archive_day(logs_collection, start, end):
+    path = os.path.join(ARCHIVE_DIR, f"logs_{start.strftime('%Y-%m-%d')}.ndjson.gz")
+    tmp_path = path + ".tmp"
+
+    # sorted by timestamp -> served by the timestamp index, no in-memory sort
+    cursor = logs_collection.find(
+        {"timestamp": {"$gte": start, "$lt": end}},
+    ).sort("timestamp", ASCENDING).batch_size(1000)
+
+    # WRITE TO TMP FILE FIRST, raw logs are only marked once the file is complete
+    count = 0
+    last_timestamp = None
+    with gzip.open(tmp_path, "wb") as f:
+        for doc in cursor:
+            last_timestamp = doc["timestamp"]
+            doc["_id"] = str(doc["_id"])
+            doc["timestamp"] = doc["timestamp"].isoformat()
+            doc.pop("archived_at", None)
+            f.write((json.dumps(doc) + "\n").encode("utf-8"))
+            count += 1
+
+    # NO FILE FOR DAYS WITHOUT READINGS
+    if count == 0:
+        os.remove(tmp_path)
+        return None, 0
+
+    os.replace(tmp_path, path)
+
+    # ONLY MARK WHAT WAS WRITTEN (up to the last timestamp in the file)
+    result = logs_collection.update_many(
+        {"timestamp": {"$gte": start, "$lte": last_timestamp}},
+        {"$set": {"archived_at": datetime.now()}},
+    )
+    return path, result.modified_count
+
+
+def main():
+    mongo_uri = os.getenv("MONGO_URI")
+    if not mongo_uri:
+        raise ValueError("MONGO_URI Umgebungsvariable ist nicht gesetzt. Bitte in den Render Environment Variables prüfen.")
+
+    client = MongoClient(mongo_uri)
+    db = client["SmartHanger"]
+    logs_collection = db["logs"]
+    ensure_log_indexes(db)
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    cutoff = today - timedelta(days=LOG_RETENTION_DAYS)
+
+    # Days already archived (waiting for the TTL) are skipped
+    oldest = logs_collection.find_one(
+        {"timestamp": {"$lt": cutoff}, "archived_at": {"$exists": False}},
+        sort=[("timestamp", ASCENDING)],
+    )
+    if not oldest:
+        print("Nothing to archive.")
+        return
+
+    day = oldest["timestamp"].replace(hour=0, minute=0, second=0, microsecond=0)
+    while day < cutoff:
+        next_day = day + timedelta(days=1)
+        rollup_day(logs_collection, day, next_day)
+        path, archived = archive_day(logs_collection, day, next_day)
+        if path:
+            print(f"{day.date()}: {archived} logs archived to {path}")
+        day = next_day
+
+
+if __name__ == "__main__":
+    main()
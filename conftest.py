@@ -0,0 +1,33 @@
+# Makes the top-level API modules importable for the tests in tests/ and
+# provides fixtures shared by them.
+from datetime import datetime, timedelta
+
+import pytest
+
+
+class FakeClock:
+    """Callable clock for injected time sources; advance() moves it forward."""
+
+    def __init__(self, start):
+        self.current = start
+
+    def __call__(self):
+        return self.current
+
+    def advance(self, seconds):
+        if isinstance(self.current, datetime):
+            self.current += timedelta(seconds=seconds)
+        else:
+            self.current += seconds
+
+
+@pytest.fixture
+def clock():
+    """Monotonic-style clock (float seconds), e.g. for time.monotonic."""
+    return FakeClock(1000.0)
+
+
+@pytest.fixture
+def wall_clock():
+    """Wall-clock style clock (datetime), e.g. for datetime.now."""
+    return FakeClock(datetime(2024, 1, 1, 12, 0, 0))
@@ -0,0 +1,106 @@
+import hashlib
+from datetime import datetime, timedelta
+from functools import wraps
+
+from flask import Response, jsonify, make_response, request
+from pymongo import ASCENDING
+from pymongo.errors import DuplicateKeyError
+
+# IDEMPOTENCY FOR CREATE/LOG ENDPOINTS
+# Clients (devices, dispatch) retry on timeouts. A retried request with the same
+# "Idempotency-Key" header gets the stored original response, without a new write.
+# Keys live in a TTL'd collection with a unique index on (endpoint, key).
+
+IDEMPOTENCY_TTL_SECONDS = 24 * 3600
+# A reservation without a stored response is only "in progress" until its lease
+# runs out. Longer than the gunicorn worker timeout, so a killed worker's key
+# can be taken over by the next retry instead of blocking it for 24h.
+IDEMPOTENCY_LEASE_SECONDS = 60
+
+
+def now():
+    return datetime.now()
+
+
+def ensure_idempotency_indexes(collection):
+    collection.create_index([("endpoint", ASCENDING), ("key", ASCENDING)], unique=True)
+    collection.create_index("created_at", expireAfterSeconds=IDEMPOTENCY_TTL_SECONDS)
+
+
+def make_idempotent(collection, key_from_body=None):
+    """Decorator factory for Flask views.
+
+    collection: the key store collection (None without DB connection -> no-op).
+    key_from_body: optional function(json_object) -> key, used when no header is sent
+    (e.g. hanger_id + device sequence number for telemetry).
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if collection is None:
+                return view(*args, **kwargs)
+
+            key = request.headers.get("Idempotency-Key")
+            if not key and key_from_body is not None:
+                data = request.get_json(force=True, silent=True)
+                key = key_from_body(data) if isinstance(data, dict) else None
+            if not key:
+                return view(*args, **kwargs)
+
+            endpoint = request.endpoint
+            fingerprint = hashlib.sha256(request.get_data()).hexdigest()
+
+            key_filter = {"endpoint": endpoint, "key": str(key)}
+
+            # RESERVE KEY (unique index -> only one request wins)
+            try:
+                collection.insert_one({
+                    **key_filter,
+                    "fingerprint": fingerprint,
+                    "created_at": now(),
+                    "locked_until": now() + timedelta(seconds=IDEMPOTENCY_LEASE_SECONDS),
+                })
+            except DuplicateKeyError:
+                stored = collection.find_one(key_filter)
+                if stored is None:
+                    # Expired between insert and lookup -> treat as new request
+                    return view(*args, **kwargs)
+                if stored["fingerprint"] != fingerprint:
+                    return jsonify({"error": "Idempotency-Key already used with a different request body"}), 422
+                if "status_code" in stored:
+                    replay = Response(stored["body"], status=stored["status_code"], mimetype=stored["mimetype"])
+                    replay.headers["Idempotent-Replayed"] = "true"
+                    return replay
+
+                # LEASE EXPIRED (worker died mid-request) -> take the key over
+                taken_over = collection.find_one_and_update(
+                    {**key_filter, "status_code": {"$exists": False}, "locked_until": {"$lte": now()}},
+                    {"$set": {"locked_until": now() + timedelta(seconds=IDEMPOTENCY_LEASE_SECONDS)}},
+                )
+                if taken_over is None:
+                    return jsonify({"error": "Request with this Idempotency-Key is still in progress"}), 409
+
+            try:
+                response = make_response(view(*args, **kwargs))
+            except Exception:
+                collection.delete_one(key_filter)
+                raise
+
+            # Server errors are not stored, so the client can retry them
+            if response.status_code >= 500:
+                collection.delete_one(key_filter)
+            else:
+                collection.update_one(
+                    key_filter,
+                    {"$set": {
+                        "status_code": response.status_code,
+                        "body": response.get_data(as_text=True),
+                        "mimetype": response.mimetype,
+                    }},
+                )
+            return response
+
+        return wrapper
+
+    return decorator
@@ -1,14 +1,25 @@
+import json
 import random
+import re
 import string
+import threading
+import time
+from collections import OrderedDict
 
 # certifi wird nicht mehr explizit importiert, da es für Render-Deployment nicht direkt benötigt wird.
-from pymongo import MongoClient
+from pymongo import ASCENDING, GEOSPHERE, MongoClient
+from pymongo.errors import DuplicateKeyError, OperationFailure
 from flask import Flask, request, jsonify
 import os
 
+from idempotency import ensure_idempotency_indexes, make_idempotent
+from tracing import init_tracing, mongo_listeners, span
+
 # python-dotenv wird nicht importiert, da Umgebungsvariablen direkt von Render kommen.
 
 app = Flask(__name__)
+# Optionales Request-Tracing (Umgebungsvariable TRACING_ENABLED=1)
+init_tracing(app)
 
 # Initialisierung der MongoDB-Client und Collection-Objekte
 client = None
@@ -16,6 +27,7 @@ db = None
 kunden_collection = None
 lieferungen_collection = None
 geodaten_collection = None
+idempotency_collection = None
 
 try:
     # MongoDB URI wird sicher aus der Umgebungsvariable MONGO_URI geladen.
@@ -33,7 +45,7 @@ try:
     )
 
     # Aufbau der MongoDB-Verbindung
-    client = MongoClient(mongo_uri)
+    client = MongoClient(mongo_uri, event_listeners=mongo_listeners())
 
     # Testen der Verbindung durch einen Ping-Befehl an die Datenbank
     client.admin.command("ping")
@@ -44,6 +56,7 @@ try:
     kunden_collection = db["kunden"]
     lieferungen_collection = db["lieferungen"]
     geodaten_collection = db["geodaten"]
+    idempotency_collection = db["idempotency_keys"]
     print("Datenbank 'SmarthomeBox' und Collections ausgewählt.")
 
 except Exception as e:
@@ -54,6 +67,84 @@ except Exception as e:
     kunden_collection = None
     lieferungen_collection = None
     geodaten_collection = None
+    idempotency_collection = None
+
+
+# Hilfsfunktion für Index-Anlage und Migrationen beim Start. Ein Fehler wird nur
+# geloggt, damit die API trotz fehlgeschlagener Index-Anlage erreichbar bleibt.
+def run_ddl(beschreibung, action):
+    try:
+        action()
+        print(f"{beschreibung}: OK")
+    except Exception as e:
+        print(f"FEHLER: {beschreibung} fehlgeschlagen: {e}")
+
+
+if db is not None:
+    # Schlüsselspeicher für wiederholte Anfragen (Idempotency-Key, eindeutig + TTL)
+    run_ddl(
+        "Indizes für Idempotency-Keys",
+        lambda: ensure_idempotency_indexes(idempotency_collection),
+    )
+
+    # "geodaten" dient als Cache Adresse -> Koordinaten, jede Adresse nur einmal.
+    # Partieller Index, da ältere Dokumente in "geodaten" kein adresse_key haben.
+    run_ddl(
+        "Index geodaten.adresse_key",
+        lambda: geodaten_collection.create_index(
+            [("adresse_key", ASCENDING)],
+            unique=True,
+            partialFilterExpression={"adresse_key": {"$exists": True}},
+        ),
+    )
+    # 2dsphere-Index auf den Lieferkoordinaten, kombiniert mit dem Status,
+    # damit Umkreis-/Polygonsuchen nach offenen Lieferungen den Index nutzen.
+    run_ddl(
+        "2dsphere-Index lieferungen.location",
+        lambda: lieferungen_collection.create_index(
+            [("location", GEOSPHERE), ("status", ASCENDING)]
+        ),
+    )
+
+    # Index für Lookups über den Sicherheitsschlüssel (Cache-Miss-Pfad)
+    run_ddl(
+        "Index lieferungen.security_key",
+        lambda: lieferungen_collection.create_index([("security_key", ASCENDING)]),
+    )
+
+    # Kundensuche: kleingeschriebene Kopien von Name und E-Mail, damit
+    # Präfixsuchen ohne Groß-/Kleinschreibung als verankerte Regex den Index nutzen.
+    # Backfill in Python: $toLower in MongoDB faltet nur ASCII ("Özdemir" bliebe
+    # groß), Anlage und Suchbegriff werden aber mit str.lower() normalisiert.
+    def backfill_kunden_lower():
+        for doc in kunden_collection.find(
+            {"name_lower": {"$exists": False}}, {"name": 1, "email": 1}
+        ):
+            kunden_collection.update_one(
+                {"_id": doc["_id"]},
+                {
+                    "$set": {
+                        "name_lower": str(doc.get("name", "")).lower(),
+                        "email_lower": str(doc.get("email", "")).lower(),
+                    }
+                },
+            )
+
+    run_ddl("Backfill name_lower/email_lower", backfill_kunden_lower)
+    # Eindeutiger Index auf name: exakte Lookups in create_customer und
+    # create_delivery ohne Collection-Scan; Duplikate werden ohnehin abgelehnt.
+    run_ddl(
+        "Index kunden.name",
+        lambda: kunden_collection.create_index([("name", ASCENDING)], unique=True),
+    )
+    run_ddl(
+        "Index kunden.name_lower",
+        lambda: kunden_collection.create_index([("name_lower", ASCENDING)]),
+    )
+    run_ddl(
+        "Index kunden.email_lower",
+        lambda: kunden_collection.create_index([("email_lower", ASCENDING)]),
+    )
 
 
 # Hilfsfunktion zur Generierung eines zufälligen Sicherheitsschlüssels.
@@ -61,6 +152,249 @@ def generate_security_key():
     return "".join(random.choices(string.ascii_letters + string.digits, k=16))
 
 
+# Lokaler Geodatensatz (JSON: {"Adresse": [lon, lat], ...}) als Stub-Geocoder.
+# Der Pfad wird optional über die Umgebungsvariable GEODATEN_DATEI gesetzt.
+lokale_geodaten = {}
+geodaten_datei = os.getenv("GEODATEN_DATEI")
+if geodaten_datei:
+    try:
+        with open(geodaten_datei, encoding="utf-8") as f:
+            for adresse, coords in json.load(f).items():
+                lokale_geodaten[" ".join(adresse.lower().split())] = [
+                    float(coords[0]),
+                    float(coords[1]),
+                ]
+        print(f"{len(lokale_geodaten)} Adressen aus {geodaten_datei} geladen.")
+    except Exception as e:
+        print(f"FEHLER: Geodaten-Datei konnte nicht geladen werden: {e}")
+
+# Prozesslokaler Cache Adresse -> [lon, lat], vor der geodaten-Collection.
+# Begrenzt per LRU (GEOCODE_CACHE_SIZE) und TTL (GEOCODE_CACHE_TTL), damit in
+# anderen Workern geänderte Koordinaten nach Ablauf neu gelesen werden.
+class GeocodeCache:
+    def __init__(self, max_size, ttl, clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry["expires"] < self.clock():
+                self.entries.pop(key, None)
+                return None
+            self.entries.move_to_end(key)
+            return entry["coords"]
+
+    def set(self, key, coords):
+        with self.lock:
+            self.entries[key] = {"coords": coords, "expires": self.clock() + self.ttl}
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+
+geocode_cache = GeocodeCache(
+    max_size=int(os.getenv("GEOCODE_CACHE_SIZE", 10000)),
+    ttl=float(os.getenv("GEOCODE_CACHE_TTL", 3600)),
+)
+
+
+# Hilfsfunktion zur Normalisierung einer Adresse als Cache-Schlüssel.
+def normalize_adresse(adresse):
+    return " ".join(str(adresse).lower().split())
+
+
+# Hilfsfunktion zum Erzeugen eines GeoJSON-Punkts ([Längengrad, Breitengrad]).
+def to_geojson_point(lon, lat):
+    return {"type": "Point", "coordinates": [float(lon), float(lat)]}
+
+
+# Hilfsfunktion zur Prüfung von Koordinaten. Gibt (lon, lat) oder None zurück.
+def parse_coordinates(lon, lat):
+    try:
+        lon = float(lon)
+        lat = float(lat)
+    except (TypeError, ValueError):
+        return None
+    if not (-180.0 <= lon <= 180.0) or not (-90.0 <= lat <= 90.0):
+        return None
+    return lon, lat
+
+
+# Speichert Koordinaten für eine Adresse im Cache und in der geodaten-Collection.
+def store_geocode(adresse, lon, lat):
+    key = normalize_adresse(adresse)
+    geodaten_collection.update_one(
+        {"adresse_key": key},
+        {
+            "$set": {
+                "adresse": adresse,
+                "adresse_key": key,
+                "location": to_geojson_point(lon, lat),
+            }
+        },
+        upsert=True,
+    )
+    geocode_cache.set(key, [float(lon), float(lat)])
+
+
+# Löst eine Adresse in Koordinaten auf. Reihenfolge: Prozess-Cache,
+# geodaten-Collection, lokaler Datensatz. Jede Adresse wird nur einmal
+# aufgelöst; Treffer aus dem Datensatz werden in "geodaten" gespeichert.
+def geocode_adresse(adresse):
+    key = normalize_adresse(adresse)
+    coords = geocode_cache.get(key)
+    if coords:
+        return coords
+
+    doc = geodaten_collection.find_one({"adresse_key": key}, {"location": 1})
+    if doc and doc.get("location"):
+        coords = doc["location"]["coordinates"]
+        geocode_cache.set(key, coords)
+        return coords
+
+    coords = lokale_geodaten.get(key)
+    if coords:
+        store_geocode(adresse, coords[0], coords[1])
+        return coords
+    return None
+
+
+# Ergänzt "location" bei bestehenden, noch nicht zugestellten Lieferungen, damit
+# Umkreis-/Polygonsuchen auch Lieferungen von vor der Geo-Erweiterung finden.
+# Nicht auflösbare Adressen werden geloggt (sie fehlen in den Geo-Abfragen).
+def backfill_lieferungen_location():
+    resolved = 0
+    unresolved = set()
+    for doc in lieferungen_collection.find(
+        {"location": {"$exists": False}, "status": {"$ne": "delivered"}},
+        {"adresse": 1},
+    ):
+        coords = geocode_adresse(doc.get("adresse", ""))
+        if coords:
+            lieferungen_collection.update_one(
+                {"_id": doc["_id"]},
+                {"$set": {"location": to_geojson_point(coords[0], coords[1])}},
+            )
+            resolved += 1
+        else:
+            unresolved.add(doc.get("adresse", ""))
+    print(f"{resolved} Lieferungen mit Koordinaten ergänzt.")
+    if unresolved:
+        print(
+            f"WARNUNG: {len(unresolved)} Adressen ohne Koordinaten "
+            f"(fehlen in /deliveries/nearby und /deliveries/within): "
+            f"{sorted(unresolved)[:20]}"
+        )
+
+
+if db is not None:
+    run_ddl("Backfill lieferungen.location", backfill_lieferungen_location)
+
+
+# Hilfsfunktion zur Umwandlung eines Lieferungsdokuments für JSON.
+def serialize_delivery(doc):
+    doc["_id"] = str(doc["_id"])
+    if "customer_id" in doc:
+        doc["customer_id"] = str(doc["customer_id"])
+    return doc
+
+
+# Read-Through-Cache security_key -> {"_id", "status"} für Sendungsverfolgung.
+# Begrenzt per LRU (STATUS_CACHE_SIZE) und TTL; zugestellte Lieferungen ändern
+# sich nicht mehr und bleiben deutlich länger im Cache.
+# Der Cache gilt pro Prozess: bei mehreren gunicorn-Workern aktualisiert
+# update_status nur die Kopie des eigenen Workers, die anderen sehen den neuen
+# Status spätestens nach STATUS_CACHE_TTL.
+class StatusCache:
+    # Status durchläuft nur pending -> on route -> delivered.
+    STATUS_RANK = {"pending": 0, "on route": 1, "delivered": 2}
+
+    def __init__(self, max_size, ttl, terminal_ttl, clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.terminal_ttl = terminal_ttl
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, security_key):
+        with self.lock:
+            entry = self.entries.get(security_key)
+            if entry is None or entry["expires"] < self.clock():
+                if entry is not None:
+                    del self.entries[security_key]
+                self.misses += 1
+                return None
+            self.entries.move_to_end(security_key)
+            self.hits += 1
+            return entry["delivery"]
+
+    # Schreibt den Status nach einer Statusänderung (write-through).
+    def set(self, security_key, delivery):
+        with self.lock:
+            self._store(security_key, delivery)
+
+    # Füllt den Cache nach einem Miss. Ein parallel per set() geschriebener,
+    # neuerer Status wird nicht mit dem älteren DB-Lesewert überschrieben.
+    def fill(self, security_key, delivery):
+        with self.lock:
+            entry = self.entries.get(security_key)
+            if (
+                entry is not None
+                and entry["expires"] >= self.clock()
+                and self.STATUS_RANK.get(entry["delivery"]["status"], 0)
+                > self.STATUS_RANK.get(delivery["status"], 0)
+            ):
+                return
+            self._store(security_key, delivery)
+
+    def _store(self, security_key, delivery):
+        ttl = self.terminal_ttl if delivery["status"] == "delivered" else self.ttl
+        self.entries[security_key] = {
+            "delivery": {"_id": delivery["_id"], "status": delivery["status"]},
+            "expires": self.clock() + ttl,
+        }
+        self.entries.move_to_end(security_key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self.entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+status_cache = StatusCache(
+    max_size=int(os.getenv("STATUS_CACHE_SIZE", 10000)),
+    ttl=float(os.getenv("STATUS_CACHE_TTL", 30)),
+    terminal_ttl=float(os.getenv("STATUS_CACHE_DELIVERED_TTL", 86400)),
+)
+
+
+# Liefert {"_id", "status"} zu einem Sicherheitsschlüssel, zuerst aus dem Cache.
+def find_delivery_status(security_key):
+    delivery = status_cache.get(security_key)
+    if delivery is None:
+        delivery = lieferungen_collection.find_one(
+            {"security_key": security_key}, {"status": 1}
+        )
+        if delivery:
+            status_cache.fill(security_key, delivery)
+    return delivery
+
+
 # Hilfsfunktion zur Überprüfung des Datenbankverbindungsstatus vor API-Aufrufen.
 def check_db_connection():
     if (
@@ -80,7 +414,9 @@ def check_db_connection():
 
 
 # API-Endpunkt zum Erstellen eines neuen Kunden.
+# Mit Header "Idempotency-Key" liefert eine Wiederholung die ursprüngliche Antwort.
 @app.route("/create_customer", methods=["POST"])
+@make_idempotent(idempotency_collection)
 def create_customer():
     # Überprüft die DB-Verbindung.
     error_response = check_db_connection()
@@ -98,14 +434,32 @@ def create_customer():
             "name": data["name"],
             "email": data["email"],
             "adresse": data["adresse"],
+            # Normalisierte Felder für die indizierte Kundensuche
+            "name_lower": str(data["name"]).lower(),
+            "email_lower": str(data["email"]).lower(),
         }
 
         # Prüfen, ob Kunde bereits existiert.
         if kunden_collection.find_one({"name": data["name"]}):
             return jsonify({"error": "Kunde mit diesem Namen existiert bereits"}), 409
 
-        # Kunden in die Datenbank einfügen.
-        customer_id = kunden_collection.insert_one(customer_data).inserted_id
+        # Optionale Koordinaten zur Adresse prüfen.
+        coords = None
+        if "lat" in data or "lon" in data:
+            coords = parse_coordinates(data.get("lon"), data.get("lat"))
+            if coords is None:
+                return jsonify({"error": "Ungültige Koordinaten (lon/lat)"}), 400
+
+        # Kunden in die Datenbank einfügen (unique-Index fängt parallele Duplikate ab).
+        try:
+            customer_id = kunden_collection.insert_one(customer_data).inserted_id
+        except DuplicateKeyError:
+            return jsonify({"error": "Kunde mit diesem Namen existiert bereits"}), 409
+
+        # Koordinaten erst nach erfolgreicher Anlage im Geo-Cache hinterlegen,
+        # damit abgelehnte Anfragen keine gemeinsamen geodaten überschreiben.
+        if coords:
+            store_geocode(data["adresse"], coords[0], coords[1])
         return (
             jsonify(
                 {
@@ -156,17 +510,93 @@ def get_customers():
         )
 
 
+# API-Endpunkt zur Kundensuche (Präfix, ohne Groß-/Kleinschreibung).
+# Beispiel: /customers/search?q=mül&field=name&page=1&page_size=20
+@app.route("/customers/search", methods=["GET"])
+def search_customers():
+    error_response = check_db_connection()
+    if error_response:
+        return error_response
+    try:
+        term = (request.args.get("q") or "").strip().lower()
+        if not term:
+            return jsonify({"error": "Suchbegriff q ist erforderlich"}), 400
+
+        field = request.args.get("field", "all")
+        if field not in ("name", "email", "all"):
+            return jsonify({"error": "field muss name, email oder all sein"}), 400
+
+        try:
+            page = int(request.args.get("page", 1))
+            page_size = int(request.args.get("page_size", 20))
+        except ValueError:
+            return jsonify({"error": "page und page_size müssen Zahlen sein"}), 400
+        if page < 1 or not (1 <= page_size <= 100):
+            return jsonify({"error": "page >= 1 und page_size 1..100 erforderlich"}), 400
+
+        # Verankerte Regex auf den kleingeschriebenen Feldern -> Index-Bereichsscan
+        # Stabile Sortierung (mit _id als Tiebreaker), damit sich Seiten weder
+        # überschneiden noch Kunden auslassen. Sort + limit ist ein Top-k-Sort
+        # nur über die per Index gefundenen Präfix-Treffer.
+        prefix = {"$regex": "^" + re.escape(term)}
+        if field == "name":
+            query = {"name_lower": prefix}
+            sort_field = "name_lower"
+        elif field == "email":
+            query = {"email_lower": prefix}
+            sort_field = "email_lower"
+        else:
+            query = {"$or": [{"name_lower": prefix}, {"email_lower": prefix}]}
+            sort_field = "name_lower"
+
+        # Eine Zeile mehr laden, um ohne count() zu erkennen, ob es weitere Seiten gibt
+        cursor = (
+            kunden_collection.find(query, {"name": 1, "email": 1, "adresse": 1})
+            .sort([(sort_field, ASCENDING), ("_id", ASCENDING)])
+            .skip((page - 1) * page_size)
+            .limit(page_size + 1)
+        )
+        customers = []
+        for doc in cursor:
+            doc["_id"] = str(doc["_id"])
+            customers.append(doc)
+
+        has_more = len(customers) > page_size
+        return jsonify(
+            {
+                "results": customers[:page_size],
+                "page": page,
+                "page_size": page_size,
+                "has_more": has_more,
+            }
+        )
+    except Exception as e:
+        print(f"Fehler in search_customers: {e}")
+        return (
+            jsonify(
+                {
+                    "error": "Interner Serverfehler bei der Kundensuche",
+                    "details": str(e),
+                }
+            ),
+            500,
+        )
+
+
 # API-Endpunkt zum Erstellen einer neuen Lieferung
+# Mit Header "Idempotency-Key" liefert eine Wiederholung die ursprüngliche Antwort.
 @app.route("/create_delivery", methods=["POST"])
+@make_idempotent(idempotency_collection)
 def create_delivery():
     error_response = check_db_connection()
     if error_response:
         return error_response
-    data = request.json
+    data = request.json  # JSON-Parsing wird im Tracing-Hook gemessen
     try:
-        customer_name = data.get("customer")
-        if not customer_name:
-            return jsonify({"error": "Kundenname in der Anfrage fehlt."}), 400
+        with span("validation"):
+            customer_name = data.get("customer")
+            if not customer_name:
+                return jsonify({"error": "Kundenname in der Anfrage fehlt."}), 400
 
         # Kunden anhand des Namens finden.
         customer = kunden_collection.find_one({"name": customer_name})
@@ -181,10 +611,27 @@ def create_delivery():
             "security_key": security_key,  # Der Sicherheitsschlüssel wird mit der Lieferung gespeichert
             "status": "pending",  # Initialer Status der Lieferung
         }
+        # Koordinaten der Adresse (GeoJSON) für Umkreis-/Polygonsuchen
+        with span("geocode"):
+            coords = geocode_adresse(delivery["adresse"])
+        if coords:
+            delivery["location"] = to_geojson_point(coords[0], coords[1])
+        else:
+            # Ohne Koordinaten fehlt die Lieferung in den Geo-Abfragen -> sichtbar machen
+            print(f"WARNUNG: Adresse ohne Koordinaten: {delivery['adresse']}")
         # Lieferung in die Datenbank einfügen
         delivery_id = lieferungen_collection.insert_one(delivery).inserted_id
         # Rückgabe der Liefer-ID und des Sicherheitsschlüssels an den Client
-        return jsonify({"delivery_id": str(delivery_id), "security_key": security_key})
+        with span("serialize"):
+            response = jsonify(
+                {
+                    "delivery_id": str(delivery_id),
+                    "security_key": security_key,
+                    # false: Adresse nicht auflösbar, nicht in Umkreis-/Polygonsuche
+                    "geocoded": coords is not None,
+                }
+            )
+        return response
     except Exception as e:
         print(f"Fehler in create_delivery: {e}")
         return (
@@ -230,10 +677,11 @@ def update_status():
             # Verhindert weitere Statusänderungen, wenn bereits zugestellt
             return jsonify({"error": "Lieferung bereits zugestellt"}), 400
 
-        # Aktualisiert den Status in der Datenbank.
+        # Aktualisiert den Status in der Datenbank und im Cache (write-through).
         lieferungen_collection.update_one(
             {"_id": delivery["_id"]}, {"$set": {"status": new_status}}
         )
+        status_cache.set(security_key, {"_id": delivery["_id"], "status": new_status})
         return jsonify({"message": f"Status aktualisiert: {new_status}"})
     except Exception as e:
         print(f"Fehler in update_status: {e}")
@@ -260,8 +708,8 @@ def verify_delivery():
         if not security_key:
             return jsonify({"error": "Sicherheitsschlüssel in der Anfrage fehlt."}), 400
 
-        # Lieferung anhand des bereitgestellten Sicherheitsschlüssels finden
-        delivery = lieferungen_collection.find_one({"security_key": security_key})
+        # Lieferung anhand des bereitgestellten Sicherheitsschlüssels finden (über den Cache)
+        delivery = find_delivery_status(security_key)
         if not delivery:
             return (
                 jsonify(
@@ -298,10 +746,7 @@ def get_deliveries():
         deliveries = []
         # Alle Lieferungen abrufen und IDs konvertieren
         for doc in lieferungen_collection.find({}):
-            doc["_id"] = str(doc["_id"])
-            if "customer_id" in doc:
-                doc["customer_id"] = str(doc["customer_id"])
-            deliveries.append(doc)
+            deliveries.append(serialize_delivery(doc))
         return jsonify(deliveries)
     except Exception as e:
         print(f"Fehler in get_deliveries: {e}")
@@ -316,6 +761,124 @@ def get_deliveries():
         )
 
 
+# API-Endpunkt: offene Lieferungen im Umkreis eines Punktes, nach Entfernung sortiert.
+# Beispiel: /deliveries/nearby?lon=13.40&lat=52.52&radius=5000&limit=50
+@app.route("/deliveries/nearby", methods=["GET"])
+def get_deliveries_nearby():
+    error_response = check_db_connection()
+    if error_response:
+        return error_response
+    try:
+        coords = parse_coordinates(request.args.get("lon"), request.args.get("lat"))
+        if coords is None:
+            return jsonify({"error": "Gültige Parameter lon und lat sind erforderlich"}), 400
+        try:
+            radius = float(request.args.get("radius", 5000))
+            limit = int(request.args.get("limit", 100))
+        except ValueError:
+            return jsonify({"error": "radius und limit müssen Zahlen sein"}), 400
+        if radius <= 0 or limit <= 0:
+            return jsonify({"error": "radius und limit müssen größer 0 sein"}), 400
+
+        query = {
+            "status": request.args.get("status", "pending"),
+            "location": {
+                "$nearSphere": {
+                    "$geometry": to_geojson_point(coords[0], coords[1]),
+                    "$maxDistance": radius,  # in Metern
+                }
+            },
+        }
+        deliveries = [
+            serialize_delivery(doc)
+            for doc in lieferungen_collection.find(query).limit(min(limit, 500))
+        ]
+        return jsonify(deliveries)
+    except Exception as e:
+        print(f"Fehler in get_deliveries_nearby: {e}")
+        return (
+            jsonify(
+                {
+                    "error": "Interner Serverfehler bei der Umkreissuche",
+                    "details": str(e),
+                }
+            ),
+            500,
+        )
+
+
+# API-Endpunkt: offene Lieferungen innerhalb eines Polygons (z. B. Liefergebiet).
+# Body: {"polygon": [[lon, lat], [lon, lat], ...], "status": "pending", "limit": 100}
+@app.route("/deliveries/within", methods=["POST"])
+def get_deliveries_within():
+    error_response = check_db_connection()
+    if error_response:
+        return error_response
+    data = request.json
+    try:
+        polygon = data.get("polygon")
+        if not isinstance(polygon, list):
+            return jsonify({"error": "Polygon als Liste von Punkten erforderlich"}), 400
+        try:
+            limit = int(data.get("limit", 100))
+        except (TypeError, ValueError):
+            return jsonify({"error": "limit muss eine Zahl sein"}), 400
+        if limit <= 0:
+            return jsonify({"error": "limit muss größer 0 sein"}), 400
+
+        ring = []
+        for point in polygon:
+            coords = (
+                parse_coordinates(point[0], point[1])
+                if isinstance(point, list) and len(point) == 2
+                else None
+            )
+            if coords is None:
+                return jsonify({"error": "Ungültiger Punkt im Polygon"}), 400
+            # Direkt aufeinanderfolgende Duplikate verwerfen
+            if not ring or ring[-1] != [coords[0], coords[1]]:
+                ring.append([coords[0], coords[1]])
+        # Mindestens 3 verschiedene Eckpunkte, sonst lehnt MongoDB das Polygon ab
+        if len({tuple(point) for point in ring}) < 3:
+            return jsonify({"error": "Polygon mit mindestens 3 verschiedenen Punkten erforderlich"}), 400
+        # GeoJSON verlangt einen geschlossenen Ring.
+        if ring[0] != ring[-1]:
+            ring.append(ring[0])
+
+        query = {
+            "status": data.get("status", "pending"),
+            "location": {
+                "$geoWithin": {"$geometry": {"type": "Polygon", "coordinates": [ring]}}
+            },
+        }
+        try:
+            deliveries = [
+                serialize_delivery(doc)
+                for doc in lieferungen_collection.find(query).limit(min(limit, 500))
+            ]
+        except OperationFailure as e:
+            # z. B. sich selbst schneidende Kanten -> Fehler des Clients, kein 500
+            return jsonify({"error": "Ungültiges Polygon", "details": str(e)}), 400
+        return jsonify(deliveries)
+    except Exception as e:
+        print(f"Fehler in get_deliveries_within: {e}")
+        return (
+            jsonify(
+                {
+                    "error": "Interner Serverfehler bei der Polygonsuche",
+                    "details": str(e),
+                }
+            ),
+            500,
+        )
+
+
+# API-Endpunkt für Kennzahlen des Status-Caches (Trefferquote, Größe)
+@app.route("/cache_stats", methods=["GET"])
+def get_cache_stats():
+    return jsonify(status_cache.stats())
+
+
 # Startpunkt der Flask-Anwendung.
 if __name__ == "__main__":
     # Der Port wird von der Umgebungsvariable PORT (gesetzt von Render) gelesen
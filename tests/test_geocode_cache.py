@@ -0,0 +1,30 @@
+import pytest
+
+pytest.importorskip("flask")
+pytest.importorskip("pymongo")
+
+from lieferung_api import GeocodeCache  # noqa: E402
+
+
+@pytest.fixture
+def cache(clock):
+    return GeocodeCache(max_size=2, ttl=60, clock=clock)
+
+
+def test_lru_evicts_least_recently_used(cache):
+    cache.set("a", [1.0, 1.0])
+    cache.set("b", [2.0, 2.0])
+    cache.get("a")  # b is now least recently used
+    cache.set("c", [3.0, 3.0])
+
+    assert cache.get("b") is None
+    assert cache.get("a") == [1.0, 1.0]
+    assert cache.get("c") == [3.0, 3.0]
+
+
+def test_entries_expire_after_ttl(cache, clock):
+    cache.set("a", [1.0, 1.0])
+    clock.advance(61)
+
+    assert cache.get("a") is None
+    assert len(cache.entries) == 0
@@ -0,0 +1,183 @@
+import pytest
+
+flask = pytest.importorskip("flask")
+from pymongo.errors import DuplicateKeyError  # noqa: E402
+
+import idempotency  # noqa: E402
+
+
+def matches(doc, query):
+    for field, cond in query.items():
+        if isinstance(cond, dict) and "$exists" in cond:
+            if (field in doc) != cond["$exists"]:
+                return False
+        elif isinstance(cond, dict) and "$lte" in cond:
+            if field not in doc or doc[field] > cond["$lte"]:
+                return False
+        elif doc.get(field) != cond:
+            return False
+    return True
+
+
+class StubCollection:
+    """In-memory stand-in for the idempotency_keys collection."""
+
+    def __init__(self):
+        self.docs = []
+
+    def find_one(self, query):
+        return next((dict(d) for d in self.docs if matches(d, query)), None)
+
+    def insert_one(self, doc):
+        if self.find_one({"endpoint": doc["endpoint"], "key": doc["key"]}):
+            raise DuplicateKeyError("duplicate key")
+        self.docs.append(dict(doc))
+
+    def update_one(self, query, update):
+        for d in self.docs:
+            if matches(d, query):
+                d.update(update["$set"])
+                return
+
+    def find_one_and_update(self, query, update):
+        for d in self.docs:
+            if matches(d, query):
+                before = dict(d)
+                d.update(update["$set"])
+                return before
+        return None
+
+    def delete_one(self, query):
+        self.docs = [d for d in self.docs if not matches(d, query)]
+
+
+@pytest.fixture
+def clock(monkeypatch, wall_clock):
+    monkeypatch.setattr(idempotency, "now", wall_clock)
+    return wall_clock
+
+
+@pytest.fixture
+def store():
+    return StubCollection()
+
+
+@pytest.fixture
+def calls():
+    return []
+
+
+@pytest.fixture
+def client(store, calls):
+    app = flask.Flask(__name__)
+
+    @app.route("/create", methods=["POST"])
+    @idempotency.make_idempotent(store, key_from_body=lambda data: data.get("seq"))
+    def create():
+        data = flask.request.get_json()
+        if not isinstance(data, dict):
+            return flask.jsonify({"error": "body must be an object"}), 400
+        calls.append(data)
+        if data.get("fail"):
+            return flask.jsonify({"error": "boom"}), 500
+        return flask.jsonify({"id": len(calls)}), 201
+
+    return app.test_client()
+
+
+def post(client, body, key="abc"):
+    headers = {"Idempotency-Key": key} if key else {}
+    return client.post("/create", json=body, headers=headers)
+
+
+def drop_stored_response(store):
+    for field in ("status_code", "body", "mimetype"):
+        store.docs[0].pop(field)
+
+
+def test_retry_replays_original_response(client, calls, clock):
+    first = post(client, {"name": "a"})
+    second = post(client, {"name": "a"})
+
+    assert first.status_code == second.status_code == 201
+    assert second.get_json() == first.get_json()
+    assert second.headers["Idempotent-Replayed"] == "true"
+    assert len(calls) == 1
+
+
+def test_key_from_body_without_header(client, calls, clock):
+    post(client, {"seq": 7}, key=None)
+    again = post(client, {"seq": 7}, key=None)
+
+    assert again.headers["Idempotent-Replayed"] == "true"
+    assert len(calls) == 1
+
+
+def test_no_key_is_not_deduplicated(client, calls, clock):
+    post(client, {"name": "a"}, key=None)
+    post(client, {"name": "a"}, key=None)
+
+    assert len(calls) == 2
+
+
+def test_non_object_body_skips_key_from_body(client, store, calls, clock):
+    response = client.post("/create", json=[1, 2])
+
+    assert response.status_code == 400
+    assert calls == []
+
+
+def test_no_collection_skips_key_extraction(calls):
+    app = flask.Flask(__name__)
+
+    def broken_key(data):
+        raise AssertionError("key_from_body must not run without a key store")
+
+    @app.route("/create", methods=["POST"])
+    @idempotency.make_idempotent(None, key_from_body=broken_key)
+    def create():
+        return flask.jsonify({"ok": True}), 201
+
+    assert app.test_client().post("/create", json={"seq": 1}).status_code == 201
+
+
+def test_same_key_different_body_is_rejected(client, calls, clock):
+    post(client, {"name": "a"})
+    response = post(client, {"name": "b"})
+
+    assert response.status_code == 422
+    assert len(calls) == 1
+
+
+def test_in_flight_request_returns_409(client, store, calls, clock):
+    post(client, {"name": "a"})
+    # Simulate a reservation whose response has not been stored yet
+    drop_stored_response(store)
+
+    response = post(client, {"name": "a"})
+
+    assert response.status_code == 409
+    assert len(calls) == 1
+
+
+def test_expired_lease_is_taken_over(client, store, calls, clock):
+    post(client, {"name": "a"})
+    # Worker died after reserving: no stored response, lease still running
+    drop_stored_response(store)
+
+    assert post(client, {"name": "a"}).status_code == 409
+
+    clock.advance(idempotency.IDEMPOTENCY_LEASE_SECONDS + 1)
+    response = post(client, {"name": "a"})
+
+    assert response.status_code == 201
+    assert len(calls) == 2
+    assert store.docs[0]["status_code"] == 201
+
+
+def test_server_error_releases_key(client, store, calls, clock):
+    assert post(client, {"fail": True}).status_code == 500
+    assert store.docs == []
+
+    assert post(client, {"fail": True}).status_code == 500
+    assert len(calls) == 2
@@ -0,0 +1,70 @@
+import pytest
+
+pytest.importorskip("flask")
+pytest.importorskip("pymongo")
+
+from lieferung_api import StatusCache  # noqa: E402
+
+
+@pytest.fixture
+def cache(clock):
+    return StatusCache(max_size=2, ttl=30, terminal_ttl=3600, clock=clock)
+
+
+def delivery(status, delivery_id=1):
+    return {"_id": delivery_id, "status": status}
+
+
+def test_miss_then_hit(cache):
+    assert cache.get("k1") is None
+    cache.fill("k1", delivery("pending"))
+
+    assert cache.get("k1") == delivery("pending")
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+    assert cache.stats()["hit_rate"] == 0.5
+
+
+def test_lru_evicts_least_recently_used(cache):
+    cache.set("k1", delivery("pending", 1))
+    cache.set("k2", delivery("pending", 2))
+    cache.get("k1")  # k2 is now least recently used
+    cache.set("k3", delivery("pending", 3))
+
+    assert cache.get("k2") is None
+    assert cache.get("k1") == delivery("pending", 1)
+    assert cache.get("k3") == delivery("pending", 3)
+    assert cache.stats()["size"] == 2
+
+
+def test_open_delivery_expires_after_ttl(cache, clock):
+    cache.set("k1", delivery("on route"))
+    clock.advance(31)
+
+    assert cache.get("k1") is None
+    assert cache.stats()["size"] == 0
+
+
+def test_delivered_uses_long_ttl(cache, clock):
+    cache.set("k1", delivery("delivered"))
+    clock.advance(31)
+    assert cache.get("k1") == delivery("delivered")
+
+    clock.advance(3600)
+    assert cache.get("k1") is None
+
+
+def test_fill_does_not_overwrite_newer_status(cache):
+    # A miss read "on route" from the DB, meanwhile update_status wrote "delivered"
+    cache.set("k1", delivery("delivered"))
+    cache.fill("k1", delivery("on route"))
+
+    assert cache.get("k1") == delivery("delivered")
+
+
+def test_fill_replaces_expired_entry(cache, clock):
+    cache.set("k1", delivery("delivered"))
+    clock.advance(3601)
+    cache.fill("k1", delivery("on route"))
+
+    assert cache.get("k1") == delivery("on route")
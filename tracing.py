@@ -0,0 +1,216 @@
+import hmac
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from datetime import datetime
+
+from flask import g, has_request_context, jsonify, request
+from pymongo import monitoring
+
+# OPT-IN REQUEST TRACING + SAMPLING PROFILER
+# TRACING_ENABLED=1        per-request span timings, kept in a ring buffer
+# TRACE_BUFFER_SIZE=200    number of completed traces kept in memory
+# TRACING_TOKEN=...        required for /debug/traces (header X-Debug-Token);
+#                          without it the endpoint is not registered
+# PROFILE_SAMPLE_RATE=0.0  share of requests (0..1) that are sampled by the profiler
+# PROFILE_SLOW_MS=500      sampled requests slower than this are dumped
+# PROFILE_INTERVAL_MS=5    stack sampling interval
+# PROFILE_DIR=profiles     output dir for folded stacks (flamegraph.pl / speedscope)
+# PROFILE_MAX_FILES=100    oldest profile files are removed beyond this count
+
+TRACING_ENABLED = os.environ.get("TRACING_ENABLED", "0") == "1"
+TRACE_BUFFER_SIZE = int(os.environ.get("TRACE_BUFFER_SIZE", 200))
+TRACING_TOKEN = os.environ.get("TRACING_TOKEN")
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", 0.0))
+PROFILE_SLOW_MS = float(os.environ.get("PROFILE_SLOW_MS", 500))
+PROFILE_INTERVAL_MS = float(os.environ.get("PROFILE_INTERVAL_MS", 5))
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "profiles")
+PROFILE_MAX_FILES = max(1, int(os.environ.get("PROFILE_MAX_FILES", 100)))
+
+traces = deque(maxlen=TRACE_BUFFER_SIZE)
+
+
+def current_trace():
+    if not TRACING_ENABLED or not has_request_context():
+        return None
+    return g.get("trace")
+
+
+@contextmanager
+def span(name):
+    """Time a phase of the current request, e.g. with span("validation"): ..."""
+    trace = current_trace()
+    if trace is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace["spans"].append({
+            "name": name,
+            "start_ms": round((start - trace["start"]) * 1000, 3),
+            "duration_ms": round((time.perf_counter() - start) * 1000, 3),
+        })
+
+
+# ------- MONGO CALLS AS SPANS ------- #
+class MongoSpanListener(monitoring.CommandListener):
+    # pymongo is synchronous, so events fire on the request thread
+    def started(self, event):
+        trace = current_trace()
+        if trace is not None:
+            trace["pending_mongo"][event.request_id] = time.perf_counter()
+
+    def succeeded(self, event):
+        self._finish(event, "ok")
+
+    def failed(self, event):
+        self._finish(event, "failed")
+
+    def _finish(self, event, outcome):
+        trace = current_trace()
+        if trace is None:
+            return
+        start = trace["pending_mongo"].pop(event.request_id, None)
+        if start is None:
+            return
+        trace["spans"].append({
+            "name": f"mongo.{event.command_name}",
+            "start_ms": round((start - trace["start"]) * 1000, 3),
+            "duration_ms": round(event.duration_micros / 1000, 3),
+            "outcome": outcome,
+        })
+
+
+def mongo_listeners():
+    """Pass to MongoClient(..., event_listeners=mongo_listeners())."""
+    return [MongoSpanListener()] if TRACING_ENABLED else []
+
+
+# ------- SAMPLING PROFILER ------- #
+class StackSampler(threading.Thread):
+    def __init__(self, thread_id):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+
+    def run(self):
+        interval = PROFILE_INTERVAL_MS / 1000
+        while not self.stopped.wait(interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(names))] += 1
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def dump_folded_stacks(trace, stacks):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+    path = os.path.join(PROFILE_DIR, f"{trace['endpoint']}_{stamp}.folded")
+    with open(path, "w") as f:
+        for stack, count in stacks.items():
+            f.write(f"{stack} {count}\n")
+
+    # ROTATE: keep only the newest PROFILE_MAX_FILES dumps
+    try:
+        dumps = sorted(
+            (os.path.join(PROFILE_DIR, name) for name in os.listdir(PROFILE_DIR) if name.endswith(".folded")),
+            key=os.path.getmtime,
+        )
+        for old in dumps[:-PROFILE_MAX_FILES]:
+            os.remove(old)
+    except OSError:
+        pass  # files removed concurrently by another worker
+    return path
+
+
+# ------- FLASK HOOKS ------- #
+def init_tracing(app, force_json=False):
+    """Register request hooks and /debug/traces. Does nothing unless TRACING_ENABLED=1.
+
+    force_json: parse bodies like the app's views do (request.get_json(force=True)),
+    so the "parse" span times the real parse and the views reuse the cached result.
+    """
+    if not TRACING_ENABLED:
+        return
+
+    @app.before_request
+    def start_trace():
+        g.trace = {
+            "method": request.method,
+            "path": request.path,
+            "endpoint": request.endpoint or "unknown",
+            "timestamp": datetime.now().isoformat(),
+            "start": time.perf_counter(),
+            "spans": [],
+            "pending_mongo": {},
+        }
+        if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+            g.sampler = StackSampler(threading.get_ident())
+            g.sampler.start()
+
+        # JSON PARSE: timed here, where the body is read first (decorators like
+        # make_idempotent and the views only hit Werkzeug's cache afterwards)
+        if request.method in ("POST", "PUT", "PATCH"):
+            with span("parse"):
+                request.get_json(force=force_json, silent=True)
+
+    @app.after_request
+    def finish_trace(response):
+        trace = g.pop("trace", None)
+        if trace is None:
+            return response
+
+        duration_ms = (time.perf_counter() - trace["start"]) * 1000
+        sampler = g.pop("sampler", None)
+        if sampler is not None:
+            sampler.stop()
+            if duration_ms >= PROFILE_SLOW_MS and sampler.stacks:
+                trace["profile"] = dump_folded_stacks(trace, sampler.stacks)
+
+        trace.pop("start")
+        trace.pop("pending_mongo")
+        trace["status_code"] = response.status_code
+        trace["duration_ms"] = round(duration_ms, 3)
+        traces.append(trace)
+        return response
+
+    @app.teardown_request
+    def stop_leftover_sampler(exc):
+        # after_request is skipped on unhandled exceptions -> don't leak the thread
+        sampler = g.pop("sampler", None)
+        if sampler is not None:
+            sampler.stop()
+
+    # NO TOKEN -> NO ENDPOINT, traces must never be readable without auth
+    if not TRACING_TOKEN:
+        print("WARNING: TRACING_TOKEN not set, /debug/traces is disabled.")
+        return
+
+    @app.route("/debug/traces", methods=["GET"])
+    def debug_traces():
+        if not hmac.compare_digest(request.headers.get("X-Debug-Token", ""), TRACING_TOKEN):
+            return jsonify({"error": "Forbidden"}), 403
+        try:
+            limit = int(request.args.get("limit", 50))
+            min_ms = float(request.args.get("min_ms", 0))
+        except ValueError:
+            return jsonify({"error": "limit must be int, min_ms must be float"}), 400
+        limit = max(1, min(limit, TRACE_BUFFER_SIZE))
+        result = [t for t in list(traces) if t["duration_ms"] >= min_ms]
+        return jsonify(result[-limit:][::-1])